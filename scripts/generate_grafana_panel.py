@@ -3,14 +3,21 @@
 
 from __future__ import annotations
 
-import argparse
+import functools
 import json
+import operator
 import re
+import sys
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import argparse
 
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_SCHEMA_PATH = PROJECT_ROOT / "METRICS.schema.json"
 COUNTER_RATE_WINDOW_DEFAULT = "5m"
 COUNTER_RATE_METRICS = {
     "conntrack",
@@ -23,7 +30,14 @@ COUNTER_RATE_METRICS = {
     "softnet",
     "vmstat",
 }
-BYTE_FIELD_TOKENS = ("byte", "bytes", "octet")
+BYTE_FIELD_RE = re.compile(r"byte|octet", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=None)
+def _field_regex(values: Tuple[str, ...]) -> str:
+    if not values:
+        return ""
+    return "^(" + "|".join(re.escape(value) for value in values) + ")$"
 
 
 def build_panel(
@@ -67,25 +81,22 @@ def build_panel(
         return name in COUNTER_RATE_METRICS
 
     def _byte_fields(fields: List[str]) -> List[str]:
-        return sorted({field for field in fields if any(token in field.lower() for token in BYTE_FIELD_TOKENS)})
+        search = BYTE_FIELD_RE.search
+        return sorted({field for field in fields if search(field)})
 
-    def _regex(values: List[str]) -> str:
-        if not values:
-            return ""
-        return "^(" + "|".join(re.escape(value) for value in values) + ")$"
+    common_filters: List[str] = []
+    if instance_var:
+        common_filters.append(f'instance=~"${{{instance_var}}}"')
+    if job_var:
+        common_filters.append(f'job=~"${{{job_var}}}"')
+    if extra_filters:
+        for key, var_name in sorted(extra_filters.items()):
+            common_filters.append(f'{key}=~"${{{var_name}}}"')
+    common_suffix = "".join("," + part for part in common_filters)
 
     def _selector(metric_name: str, extra_labels: Optional[List[str]] = None) -> str:
-        parts = [f'__name__="{metric_name}"']
-        if instance_var:
-            parts.append(f'instance=~"${{{instance_var}}}"')
-        if job_var:
-            parts.append(f'job=~"${{{job_var}}}"')
-        if extra_filters:
-            for key, var_name in sorted(extra_filters.items()):
-                parts.append(f'{key}=~"${{{var_name}}}"')
-        if extra_labels:
-            parts.extend(extra_labels)
-        return "{" + ",".join(parts) + "}"
+        extra = "," + ",".join(extra_labels) if extra_labels else ""
+        return f'{{__name__="{metric_name}"{common_suffix}{extra}}}'
 
     def _legend(metric: Dict[str, Any]) -> str:
         labels = _metric_labels(metric)
@@ -112,7 +123,7 @@ def build_panel(
 
     targets: List[Dict[str, Any]] = []
     ref_index = 0
-    for metric in sorted(metrics, key=lambda item: str(item.get("name", ""))):
+    for metric in metrics:
         name = str(metric.get("name", ""))
         if not name:
             continue
@@ -128,14 +139,14 @@ def build_panel(
             if has_field_label and fields:
                 byte_fields = _byte_fields(fields)
                 if byte_fields:
-                    byte_regex = _regex(byte_fields)
-                    byte_selector = selector[:-1] + f',field=~"{byte_regex}"}}'
+                    byte_regex = _field_regex(tuple(byte_fields))
+                    byte_selector = _selector(name, [f'field=~"{byte_regex}"'])
                     byte_expr = f"rate({byte_selector}[{rate_window}]) * 8"
                     targets.append(_make_target(_ref_id(ref_index), byte_expr, f"{legend} (bits/s)"))
                     ref_index += 1
 
                     if set(fields) != set(byte_fields):
-                        non_byte_selector = selector[:-1] + ',field!~"' + byte_regex + '"}'
+                        non_byte_selector = _selector(name, [f'field!~"{byte_regex}"'])
                         non_byte_expr = f"rate({non_byte_selector}[{rate_window}])"
                         targets.append(_make_target(_ref_id(ref_index), non_byte_expr, legend))
                         ref_index += 1
@@ -181,6 +192,9 @@ def _label_selector(job_var: Optional[str], metric_selector: str = ".+") -> str:
     return "{" + ",".join(labels) + "}"
 
 
+DEFAULT_LABEL_SELECTOR = _label_selector(None)
+
+
 def build_panel_template_vars(
     datasource_ref: str,
     datasource_type: str,
@@ -188,7 +202,7 @@ def build_panel_template_vars(
     job_var: Optional[str],
 ) -> List[Dict[str, Any]]:
     vars_list: List[Dict[str, Any]] = []
-    selector = _label_selector(job_var)
+    selector = _label_selector(job_var) if job_var else DEFAULT_LABEL_SELECTOR
 
     if job_var:
         vars_list.append(
@@ -313,6 +327,8 @@ def build_dashboard(
 
 
 def build_parser() -> argparse.ArgumentParser:
+    import argparse
+
     parser = argparse.ArgumentParser(
         prog="python3 scripts/generate_grafana_panel.py",
         description="Generate Grafana panel JSON (paste panel or dashboard) from METRICS.schema.json.",
@@ -331,7 +347,7 @@ def build_parser() -> argparse.ArgumentParser:
             "   python3 scripts/generate_grafana_panel.py --all --dashboard --datasource DS_PROMETHEUS --instance-var instance --dashboard-title \"Linux Exporter\" --output dashboard.json\n"
         ),
     )
-    parser.add_argument("--schema", default=str(PROJECT_ROOT / "METRICS.schema.json"), help="Path to schema JSON")
+    parser.add_argument("--schema", default=str(DEFAULT_SCHEMA_PATH), help="Path to schema JSON")
     parser.add_argument("--datasource", default="DS_PROMETHEUS", help="Grafana datasource UID variable name")
     parser.add_argument("--datasource-type", default="prometheus", help="Grafana datasource type")
     parser.add_argument("--instance-var", default="instance", help="Grafana variable for dynamic instance selector")
@@ -375,9 +391,62 @@ def parse_args() -> argparse.Namespace:
     return build_parser().parse_args()
 
 
+def fast_parse_args(argv: List[str]) -> Optional[SimpleNamespace]:
+    # Plain `--list` (optionally with `--schema PATH`) does not need the full parser.
+    if "--list" not in argv:
+        return None
+    rest = [token for token in argv if token != "--list"]
+    if not rest:
+        schema = str(DEFAULT_SCHEMA_PATH)
+    elif len(rest) == 2 and rest[0] == "--schema" and not rest[1].startswith("-"):
+        schema = rest[1]
+    elif len(rest) == 1 and rest[0].startswith("--schema="):
+        schema = rest[0][len("--schema="):]
+    else:
+        return None
+    return SimpleNamespace(schema=schema, list=True)
+
+
+def _dumps(data: Any, pretty: bool = False) -> bytes:
+    if pretty:
+        return json.dumps(data, indent=2).encode("utf-8")
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
 def load_schema(path: Path) -> Dict[str, Any]:
-    with open(path, encoding="utf-8") as fp:
-        return json.load(fp)
+    return json.loads(path.read_bytes())
+
+
+_SchemaIndex = Tuple[
+    Dict[str, List[Dict[str, Any]]],
+    Dict[str, int],
+    List[Tuple[str, str, Dict[str, Any]]],
+]
+
+
+def _index_schema(schema: Dict[str, Any]) -> _SchemaIndex:
+    by_group: Dict[str, List[Dict[str, Any]]] = {}
+    counts: Dict[str, int] = {}
+    _str = str
+    for entry in schema.get("metrics", []):
+        get = entry.get
+        group = _str(get("group", ""))
+        counts[group] = counts.get(group, 0) + 1
+        # Nameless entries still count towards --list but cannot be sorted or rendered.
+        if not isinstance(get("name"), _str):
+            continue
+        group_list = by_group.get(group)
+        if group_list is None:
+            group_list = by_group[group] = []
+        group_list.append(entry)
+
+    by_name = operator.itemgetter("name")
+    names_per_entry: List[Tuple[str, str, Dict[str, Any]]] = []
+    for group, entries in by_group.items():
+        entries.sort(key=by_name)
+        names_per_entry.extend((group, entry["name"], entry) for entry in entries)
+
+    return by_group, counts, names_per_entry
 
 
 def find_section_metrics(
@@ -385,17 +454,21 @@ def find_section_metrics(
     sections: List[str],
     metrics: List[str],
     metric_regex: Optional[str],
+    index: Optional[_SchemaIndex] = None,
 ) -> Dict[str, List[Dict[str, Any]]]:
-    selected: Dict[str, List[Dict[str, Any]]] = {}
+    by_group, _, names_per_entry = index or _index_schema(schema)
     regex = re.compile(metric_regex) if metric_regex else None
 
-    for entry in schema.get("metrics", []):
-        group = str(entry.get("group", ""))
-        name = str(entry.get("name", ""))
+    if not metrics and regex is None:
+        return {group: list(entries) for group, entries in by_group.items() if not sections or group in sections}
 
-        if sections and group not in sections:
+    wanted_sections = set(sections) & by_group.keys() if sections else None
+    wanted_metrics = set(metrics) if metrics else None
+    selected: Dict[str, List[Dict[str, Any]]] = {}
+    for group, name, entry in names_per_entry:
+        if wanted_sections is not None and group not in wanted_sections:
             continue
-        if metrics and name not in metrics:
+        if wanted_metrics is not None and name not in wanted_metrics:
             continue
         if regex and not regex.search(name):
             continue
@@ -405,20 +478,17 @@ def find_section_metrics(
     return selected
 
 
-def section_metrics_map(schema: Dict[str, Any], group_names: List[str]) -> Dict[str, List[Dict[str, Any]]]:
-    metrics_map: Dict[str, List[Dict[str, Any]]] = {}
-    for entry in schema.get("metrics", []):
-        group = str(entry.get("group", ""))
-        if group in group_names:
-            metrics_map.setdefault(group, []).append(entry)
-    return metrics_map
+def section_metrics_map(
+    schema: Dict[str, Any],
+    group_names: List[str],
+    index: Optional[_SchemaIndex] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    by_group = (index or _index_schema(schema))[0]
+    return {group: list(by_group[group]) for group in group_names if group in by_group}
 
 
-def list_sections(schema: Dict[str, Any]) -> str:
-    counts: Dict[str, int] = {}
-    for entry in schema.get("metrics", []):
-        group = str(entry.get("group", ""))
-        counts[group] = counts.get(group, 0) + 1
+def list_sections(schema: Dict[str, Any], index: Optional[_SchemaIndex] = None) -> str:
+    counts = (index or _index_schema(schema))[1]
 
     lines = ["Available groups:"]
     for group in sorted(counts):
@@ -440,26 +510,36 @@ def show_help_if_no_selector(args: argparse.Namespace, parser: argparse.Argument
     raise SystemExit(0)
 
 
-def render_output(data: Any, fmt: str, pretty: bool) -> str:
+def iter_render(data: Any, fmt: str, pretty: bool) -> Iterator[bytes]:
+    if fmt == "ndjson" and isinstance(data, list):
+        for idx, panel in enumerate(data):
+            if idx:
+                yield b"\n"
+            yield _dumps(panel)
+        return
+
     if fmt == "ndjson":
-        if isinstance(data, list):
-            return "\n".join(json.dumps(panel, separators=(",", ":")) for panel in data)
-        return json.dumps(data, separators=(",", ":"))
+        yield _dumps(data)
+        return
 
-    if fmt == "array":
-        if pretty:
-            return json.dumps(data, indent=2)
-        return json.dumps(data, separators=(",", ":"))
+    if fmt == "array" and not pretty and isinstance(data, list):
+        yield b"["
+        for idx, panel in enumerate(data):
+            if idx:
+                yield b","
+            yield _dumps(panel)
+        yield b"]"
+        return
 
-    if pretty:
-        return json.dumps(data, indent=2)
-    return json.dumps(data, separators=(",", ":"))
+    yield _dumps(data, pretty)
 
 
 def main() -> None:
-    parser = build_parser()
-    args = parser.parse_args()
-    show_help_if_no_selector(args, parser)
+    args = fast_parse_args(sys.argv[1:])
+    if args is None:
+        parser = build_parser()
+        args = parser.parse_args()
+        show_help_if_no_selector(args, parser)
 
     schema_path = Path(args.schema)
     if not schema_path.exists():
@@ -471,8 +551,10 @@ def main() -> None:
 
     schema = load_schema(schema_path)
 
+    index = _index_schema(schema)
+
     if args.list:
-        output = list_sections(schema)
+        output = list_sections(schema, index)
         print(output)
         return
 
@@ -485,11 +567,11 @@ def main() -> None:
         unknown = [s for s in sections if s not in schema_sections]
         if unknown:
             raise SystemExit(f"Unknown section(s): {', '.join(unknown)}")
-        selected = find_section_metrics(schema, sections, args.metric or [], args.metric_regex)
+        selected = find_section_metrics(schema, sections, args.metric or [], args.metric_regex, index)
     else:
-        selected = section_metrics_map(schema, schema_sections)
+        selected = section_metrics_map(schema, schema_sections, index)
         if args.metric or args.metric_regex:
-            selected = find_section_metrics(schema, [], args.metric or [], args.metric_regex)
+            selected = find_section_metrics(schema, [], args.metric or [], args.metric_regex, index)
 
     if not selected:
         raise SystemExit("No metrics matched the selection")
@@ -537,11 +619,15 @@ def main() -> None:
     else:
         payload = panels[0]
 
-    output = render_output(payload, args.format, args.pretty)
+    chunks = iter_render(payload, args.format, args.pretty)
     if args.output:
-        Path(args.output).write_text(output, encoding="utf-8")
+        with open(args.output, "wb") as fp:
+            fp.writelines(chunks)
     else:
-        print(output)
+        stdout = sys.stdout.buffer
+        stdout.writelines(chunks)
+        stdout.write(b"\n")
+        stdout.flush()
 
 
 if __name__ == "__main__":
@@ -9,16 +9,31 @@ host.
 from __future__ import annotations
 
 import argparse
+import functools
 import json
-from collections import OrderedDict
-from datetime import datetime, timezone
+import os
 import re
+import sys
+import time
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Container, Dict, List, Optional, Tuple
 
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 
+_RE_H2 = re.compile(r"^##\s+(.*)$")
+_RE_TABLE_HEADER = re.compile(r"^\|\s*Metric\s*\|\s*Type\s*\|\s*Description\s*\|$")
+_RE_TABLE_SEP = re.compile(r"^\|\s*-+\s*\|")
+_RE_CATALOG_LINE = re.compile(
+    r"^(?:"
+    r"###\s+(?P<h3>.*)"
+    r"|`(?P<direct>[^`]+)`\s*:\s*(?P<body>.+)"
+    r"|`(?P<label_values>[^`]+)`\s+label values(?:\s*\(`(?P<label>[^`]+)`\))?:"
+    r"|`(?P<fields>[^`]+)`\s+field values (?:include|are generated from\s+`/proc`.*):"
+    r")$"
+)
+_RE_BACKTICK = re.compile(r"`([^`]+)`")
+_RE_PAIR_ROW = re.compile(r"(?m)^[ \t]*([^:\n]*):(.*)$")
 
 SOFTNET_FIELDS = [
     "softnet_cpu_index",
@@ -71,38 +86,55 @@ NETDEV_FIELDS = [
     "sent_compressed",
 ]
 
+NETSTAT_ALIASES = frozenset({"netstat", "ip_ext", "tcp_ext", "mptcp_ext"})
+
+
+def _metadata_entry(metadata: Dict[str, Optional[dict]], name: str) -> dict:
+    # Entries stay None until a label or field is recorded for the metric.
+    entry = metadata.get(name)
+    if entry is None:
+        entry = metadata[name] = {"labels": [], "label_values": {}, "fields": []}
+    return entry
+
+
+def _clean_cell(cell: str) -> str:
+    return cell.strip().strip("`")
+
 
 def _parse_table_row(line: str) -> Optional[Tuple[str, str, str]]:
     if not line.startswith("|"):
         return None
-    cells = [cell.strip() for cell in line.strip().strip("|").split("|")]
-    if len(cells) < 3:
+    body = line.strip().strip("|")
+    first_sep = body.find("|")
+    second_sep = body.find("|", first_sep + 1) if first_sep >= 0 else -1
+    if second_sep < 0:
         return None
-    metric = cells[0].strip().strip("`")
-    if re.search(r"\s", metric):
+    metric = _clean_cell(body[:first_sep])
+    if any(ch.isspace() for ch in metric):
         return None
-    metric_type = cells[1].strip()
-    description = " | ".join(cells[2:]).strip()
+    metric_type = body[first_sep + 1 : second_sep].strip()
+    description = body[second_sep + 1 :]
+    if "|" in description:
+        description = " | ".join(cell.strip() for cell in description.split("|"))
+    description = description.strip()
     if not metric or not metric_type:
         return None
     return metric, metric_type, description
 
 
-def _resolve_metric_name(metric: str, known_names: Set[str]) -> str:
+def _resolve_metric_name(metric: str, known_names: Container[str]) -> str:
     if metric in known_names:
         return metric
-    if metric in {"netstat", "ip_ext", "tcp_ext", "mptcp_ext"}:
+    if metric in NETSTAT_ALIASES:
         return "netstat"
     if metric.startswith("tcp_ext_") or metric.startswith("ip_ext_") or metric.startswith("mptcp_ext_"):
         return "netstat"
     return metric
 
 
-def _parse_markdown(path: Path) -> Tuple[OrderedDict[str, List[dict]], Dict[str, dict]]:
-    text = path.read_text(encoding="utf-8").splitlines()
-
-    groups: OrderedDict[str, list[dict]] = OrderedDict()
-    metadata: Dict[str, dict] = {}
+def _parse_markdown(path: Path) -> Tuple[Dict[str, List[dict]], Dict[str, Optional[dict]]]:
+    groups: Dict[str, list[dict]] = {}
+    metadata: Dict[str, Optional[dict]] = {}
 
     in_group = False
     in_labels_section = False
@@ -110,109 +142,101 @@ def _parse_markdown(path: Path) -> Tuple[OrderedDict[str, List[dict]], Dict[str,
     capture: dict | None = None
     current_group = ""
 
-    for raw_line in text:
-        line = raw_line.rstrip()
+    with path.open("r", encoding="utf-8", buffering=1 << 20) as fp:
+        for raw_line in fp:
+            line = raw_line.rstrip()
+            stripped = line.lstrip()
+            first = stripped[:1]
 
-        heading2 = re.match(r"^##\s+(.*)$", line)
-        if heading2:
-            title = heading2.group(1).strip()
-            in_table = False
-            capture = None
+            heading2 = _RE_H2.match(line) if line.startswith("##") else None
+            if heading2:
+                title = heading2.group(1)
+                in_table = False
+                capture = None
 
-            if title == "Metric labels and field catalogs":
-                in_labels_section = True
-                in_group = False
-                continue
+                if title == "Metric labels and field catalogs":
+                    in_labels_section = True
+                    in_group = False
+                    continue
 
-            if title.startswith("TODO"):
-                in_labels_section = False
-                in_group = False
+                if title.startswith("TODO"):
+                    in_labels_section = False
+                    in_group = False
+                    current_group = title
+                    continue
+
+                if title in groups:
+                    pass
+                groups.setdefault(title, [])
                 current_group = title
+                in_labels_section = False
+                in_group = True
                 continue
 
-            if title in groups:
-                pass
-            groups.setdefault(title, [])
-            current_group = title
-            in_labels_section = False
-            in_group = True
-            continue
-
-        if not in_labels_section and in_group:
-            if re.match(r"^\|\s*Metric\s*\|\s*Type\s*\|\s*Description\s*\|$", line.strip()):
-                in_table = True
-                continue
-            if in_table:
-                if re.match(r"^\|\s*-+\s*\|", line.strip()):
+            if not in_labels_section and in_group:
+                if first == "|" and _RE_TABLE_HEADER.match(stripped):
+                    in_table = True
                     continue
-                if line.startswith("|"):
-                    parsed = _parse_table_row(line)
-                    if parsed:
-                        name, metric_type, description = parsed
-                        groups[current_group].append(
-                            {
-                                "name": name,
-                                "type": metric_type,
-                                "description": description,
-                                "group": current_group,
-                            }
-                        )
-                        metadata.setdefault(name, {"labels": [], "label_values": {}, "fields": []})
+                if in_table:
+                    if first == "|" and _RE_TABLE_SEP.match(stripped):
                         continue
-                in_table = False
-            continue
-
-        if not in_labels_section:
-            continue
-
-        heading3 = re.match(r"^###\s+(.*)$", line)
-        if heading3:
-            capture = None
-            continue
-
-        direct = re.match(r"^`(?P<metric>[^`]+)`\s*:\s*(?P<body>.+)$", line.strip())
-        if direct:
-            metric = _resolve_metric_name(direct.group("metric"), set(metadata))
-            body = direct.group("body")
-            labels = re.findall(r"`([^`]+)`", body)
-            if labels:
-                metadata.setdefault(metric, {"labels": [], "label_values": {}, "fields": []})["labels"] = labels
-            capture = None
-            continue
+                    if line.startswith("|"):
+                        parsed = _parse_table_row(line)
+                        if parsed:
+                            name, metric_type, description = parsed
+                            groups[current_group].append(
+                                {
+                                    "name": name,
+                                    "type": metric_type,
+                                    "description": description,
+                                    "group": current_group,
+                                }
+                            )
+                            metadata.setdefault(name, None)
+                            continue
+                    in_table = False
+                continue
 
-        list_header = re.match(r"^`(?P<metric>[^`]+)`\s+label values(?:\s*\(`(?P<label>[^`]+)`\))?:$", line.strip())
-        if list_header:
-            metric = _resolve_metric_name(list_header.group("metric"), set(metadata))
-            label = list_header.group("label") or "value"
-            metadata.setdefault(metric, {"labels": [], "label_values": {}, "fields": []})
-            capture = {
-                "metric": metric,
-                "kind": "label_values",
-                "label": label,
-            }
-            continue
+            if not in_labels_section:
+                continue
 
-        field_list_header = re.match(
-            r"^`(?P<metric>[^`]+)`\s+field values (?:include|are generated from\s+`/proc`.*):$",
-            line.strip(),
-        )
-        if field_list_header:
-            metric = _resolve_metric_name(field_list_header.group("metric"), set(metadata))
-            metadata.setdefault(metric, {"labels": [], "label_values": {}, "fields": []})
-            capture = {"metric": metric, "kind": "fields", "label": None}
-            continue
+            catalog = _RE_CATALOG_LINE.match(stripped) if first == "`" or line.startswith("###") else None
+            if catalog is not None:
+                if catalog.group("direct") is not None:
+                    metric = _resolve_metric_name(catalog.group("direct"), metadata)
+                    labels = list(dict.fromkeys(_RE_BACKTICK.findall(catalog.group("body"))))
+                    if labels:
+                        _metadata_entry(metadata, metric)["labels"] = labels
+                    capture = None
+                elif catalog.group("label_values") is not None:
+                    metric = _resolve_metric_name(catalog.group("label_values"), metadata)
+                    metadata.setdefault(metric, None)
+                    capture = {
+                        "metric": metric,
+                        "kind": "label_values",
+                        "label": catalog.group("label") or "value",
+                    }
+                elif catalog.group("fields") is not None:
+                    metric = _resolve_metric_name(catalog.group("fields"), metadata)
+                    metadata.setdefault(metric, None)
+                    capture = {"metric": metric, "kind": "fields", "label": None}
+                else:
+                    capture = None
+                continue
 
-        if line.strip() and not line.startswith("-") and capture is not None:
-            # Stop capturing list mode at the next non-list content.
-            capture = None
+            if capture is None or not stripped:
+                continue
+            if not line.startswith("-"):
+                # Stop capturing list mode at the next non-list content.
+                capture = None
+                continue
 
-        if capture and line.strip().startswith("-"):
-            value_match = re.findall(r"`([^`]+)`", line)
-            value = value_match[0] if value_match else line.strip("- ").strip()
+            value_match = _RE_BACKTICK.search(line) if "`" in line else None
+            value = value_match.group(1) if value_match else line.strip("- ").strip()
             if not value:
                 continue
 
-            target = metadata.setdefault(capture["metric"], {"labels": [], "label_values": {}, "fields": []})
+            target = _metadata_entry(metadata, capture["metric"])
             if capture["kind"] == "label_values":
                 values = target.setdefault("label_values", {}).setdefault(capture["label"], [])
                 if value not in values:
@@ -224,14 +248,28 @@ def _parse_markdown(path: Path) -> Tuple[OrderedDict[str, List[dict]], Dict[str,
     return groups, metadata
 
 
+def _read_proc(path: str) -> str:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        chunks = []
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+    return b"".join(chunks).decode("ascii", "ignore")
+
+
 def _fields_from_key_value_file(path: str, prefix: str = "") -> list[str]:
     try:
-        lines = Path(path).read_text(encoding="utf-8", errors="ignore").splitlines()
+        data = _read_proc(path)
     except FileNotFoundError:
         return []
 
     fields: list[str] = []
-    for line in lines:
+    for line in data.splitlines():
         if ":" not in line:
             continue
         name = line.split(":", 1)[0].strip()
@@ -242,34 +280,35 @@ def _fields_from_key_value_file(path: str, prefix: str = "") -> list[str]:
     return fields
 
 
+@functools.lru_cache(maxsize=None)
+def _pair_section_name(section: str, prefix_mode: str) -> str:
+    section = section.lower()
+    if prefix_mode == "netstat":
+        if section.endswith("ext"):
+            return section[:-3] + "_ext"
+        if section.startswith("mptcp"):
+            return "mptcp_ext"
+    return section
+
+
 def _fields_from_proc_net_pair_file(path: str, prefix_mode: str) -> list[str]:
     try:
-        lines = Path(path).read_text(encoding="utf-8", errors="ignore").splitlines()
+        data = _read_proc(path)
     except FileNotFoundError:
         return []
 
+    rows = _RE_PAIR_ROW.findall(data)
     fields: list[str] = []
-    for i in range(0, len(lines) - 1, 2):
-        line_a = lines[i].strip()
-        line_b = lines[i + 1].strip()
-        if ":" not in line_a or ":" not in line_b:
-            continue
-        section_a, rest_a = line_a.split(":", 1)
-        section_b, _ = line_b.split(":", 1)
+    for i in range(0, len(rows) - 1, 2):
+        section_a, rest_a = rows[i]
+        section_b, _ = rows[i + 1]
         if section_a != section_b:
             continue
-        labels = rest_a.split()
+        labels = rest_a.lower().split()
         if not labels:
             continue
-        if prefix_mode == "netstat":
-            section = section_a.lower()
-            if section.endswith("ext"):
-                section = section[:-3] + "_ext"
-            elif section.startswith("mptcp"):
-                section = "mptcp_ext"
-        else:
-            section = section_a.lower()
-        fields.extend([f"{section}_{name.lower()}" for name in labels])
+        section = _pair_section_name(section_a, prefix_mode)
+        fields.extend(f"{section}_{name}" for name in labels)
     return fields
 
 
@@ -287,53 +326,57 @@ def _append_runtime_fields(schema: dict, args: argparse.Namespace) -> None:
         "softnet": SOFTNET_FIELDS,
     }
 
+    by_name: Dict[str, dict] = {}
+    for item in schema["metrics"]:
+        by_name.setdefault(item["name"], item)
+
     for metric, discovered_fields in runtime_fields.items():
-        for item in schema["metrics"]:
-            if item["name"] != metric:
-                continue
-            if discovered_fields:
-                item["fields_detected"] = discovered_fields
-            break
+        item = by_name.get(metric)
+        if item is not None and discovered_fields:
+            item["fields_detected"] = discovered_fields
 
 
 def _dedupe_fields(metrics: list[dict]) -> None:
+    # The markdown parser already keeps `fields` and `label_values` unique.
     for metric in metrics:
-        if "fields" in metric:
-            metric["fields"] = list(dict.fromkeys(metric["fields"]))
-        if "labels" in metric:
-            metric["labels"] = list(dict.fromkeys(metric["labels"]))
-        if "fields_detected" in metric:
-            seen = dict.fromkeys(metric["fields_detected"])
-            metric["fields_detected"] = list(seen.keys())
-        if "label_values" in metric:
-            cleaned = {}
-            for label_name, values in metric["label_values"].items():
-                cleaned[label_name] = list(dict.fromkeys(values))
-            metric["label_values"] = cleaned
+        for key in ("labels", "fields_detected"):
+            values = metric.get(key)
+            if values and len(values) > 1:
+                metric[key] = list(dict.fromkeys(values))
+
+
+def _dumps(data: dict, pretty: bool) -> bytes:
+    if pretty:
+        return json.dumps(data, indent=2).encode("utf-8")
+    return json.dumps(data).encode("utf-8")
 
 
 def generate_schema(markdown_path: Path, args: argparse.Namespace) -> dict:
     groups, metadata = _parse_markdown(markdown_path)
     metrics: list[dict] = []
 
+    metadata_get = metadata.get
     for group_name, group_metrics in groups.items():
         for metric in group_metrics:
-            metric_meta = metadata.get(metric["name"], {})
-            metrics.append(
-                {
-                    "name": metric["name"],
-                    "group": group_name,
-                    "type": metric["type"],
-                    "description": metric["description"],
-                    "labels": metric_meta.get("labels", []),
-                    **({"label_values": metric_meta["label_values"]} if metric_meta.get("label_values") else {}),
-                    **({"fields": metric_meta.get("fields", [])} if metric_meta.get("fields") else {}),
-                }
-            )
+            name = metric["name"]
+            metric_meta = metadata_get(name)
+            entry = {
+                "name": name,
+                "group": group_name,
+                "type": metric["type"],
+                "description": metric["description"],
+                "labels": metric_meta["labels"] if metric_meta else [],
+            }
+            if metric_meta:
+                if metric_meta["label_values"]:
+                    entry["label_values"] = metric_meta["label_values"]
+                if metric_meta["fields"]:
+                    entry["fields"] = metric_meta["fields"]
+            metrics.append(entry)
 
     schema = {
         "version": "1.0.0",
-        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime()),
         "source_file": str(markdown_path),
         "metrics": metrics,
         "groups": [
@@ -372,13 +415,16 @@ def main() -> None:
     args = parser.parse_args()
     markdown_path = Path(args.source)
     schema = generate_schema(markdown_path, args)
-    output_json = json.dumps(schema, indent=2 if args.pretty else None, sort_keys=False)
+    output_json = _dumps(schema, args.pretty)
 
     if args.output:
-        Path(args.output).write_text(output_json, encoding="utf-8")
+        Path(args.output).write_bytes(output_json)
         return
 
-    print(output_json)
+    stdout = sys.stdout.buffer
+    stdout.write(output_json)
+    stdout.write(b"\n")
+    stdout.flush()
 
 
 if __name__ == "__main__":